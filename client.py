@@ -0,0 +1,53 @@
+import requests
+
+# Thin client for server.py. The price functions mirror getprice.py, taking the
+# server URL in place of the API key.
+
+class ServerError(Exception):
+    def __init__(self, message, status=None):
+        super().__init__(message)
+        self.status = status
+
+def _request(method, server, path, **kwargs):
+    try:
+        response = requests.request(method, f"{server.rstrip('/')}{path}", timeout=30, **kwargs)
+        data = response.json()
+    except ValueError:
+        raise ServerError(f"Invalid response from server ({response.status_code})", response.status_code)
+    except requests.RequestException as e:
+        raise ServerError(f"Could not reach server: {e}")
+    if response.status_code != 200:
+        raise ServerError(data.get('error', f"Server returned {response.status_code}"), response.status_code)
+    return data
+
+def get_gold_price(server, currency):
+    data = _request('GET', server, "/price", params={'currency': currency})
+    return data['gold_price'], data['timestamp']
+
+def get_exchange_rate(server, from_currency, to_currency):
+    data = _request('GET', server, "/rate", params={'from': from_currency, 'to': to_currency})
+    return data['rate']
+
+def get_historical_gold_price(server, date, currency):
+    data = _request('GET', server, "/historical", params={'date': date, 'currency': currency})
+    return data['gold_price']
+
+def load_portfolio(server, name):
+    """Returns the portfolio, or None if the server doesn't have one by that name"""
+    try:
+        return _request('GET', server, f"/portfolios/{name}")
+    except ServerError as e:
+        if e.status == 404:
+            return None
+        raise
+
+def save_portfolio(server, name, inventory=None, currency=None):
+    update = {}
+    if inventory is not None:
+        update['inventory'] = inventory
+    if currency is not None:
+        update['currency'] = currency
+    return _request('PUT', server, f"/portfolios/{name}", json=update)
+
+def get_timeline(server, name):
+    return _request('GET', server, f"/portfolios/{name}/timeline")['timeline']
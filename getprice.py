@@ -19,7 +19,7 @@ def load_config():
 def get_gold_price(api_key, currency):
     # Fetch rates with base USD and currencies XAU and user currency
     url = f"https://api.metalpriceapi.com/v1/latest?api_key={api_key}&base=USD&currencies=XAU,{currency}"
-    response = requests.get(url)
+    response = requests.get(url, timeout=10)
     data = response.json()
 
     if 'rates' in data and 'XAU' in data['rates'] and currency in data['rates']:
@@ -40,7 +40,7 @@ def get_gold_price(api_key, currency):
 
 def get_exchange_rate(api_key, from_currency, to_currency):
     url = f"https://api.metalpriceapi.com/v1/latest?api_key={api_key}&base={from_currency}&currencies={to_currency}"
-    response = requests.get(url)
+    response = requests.get(url, timeout=10)
     data = response.json()
     
     if 'rates' in data and to_currency in data['rates']:
@@ -3,7 +3,7 @@ from bs4 import BeautifulSoup
 import json
 
 def get_cgt_free_coin_price(url):
-    response = requests.get(url)
+    response = requests.get(url, timeout=10)
     soup = BeautifulSoup(response.content, 'html.parser')
     
     # Find the div with the data-product-settings attribute
@@ -20,22 +20,22 @@ def get_cgt_free_coin_price(url):
     else:
         raise ValueError("Product data not found on the page")
 
+BRITANNIA_URLS = {
+    "1oz": "https://www.royalmint.com/invest/bullion/bullion-coins/gold-coins/britannia-2025-1oz-gold-bullion-coin/",
+    "1/2oz": "https://www.royalmint.com/invest/bullion/bullion-coins/gold-coins/britannia-2024-half-oz-gold-bullion-coin-in-blister/",
+    "1/4oz": "https://www.royalmint.com/invest/bullion/bullion-coins/gold-coins/britannia-2025-14oz-gold-bullion-coin-in-blister/"
+}
+
+SOVEREIGN_URLS = {
+    "double": "https://www.royalmint.com/invest/bullion/bullion-coins/gold-coins/the-double-sovereign-2024-gold-bullion-coin-in-blister/",
+    "full": "https://www.royalmint.com/invest/bullion/bullion-coins/gold-coins/the-sovereign-2024-gold-bullion-coin-in-blister/",
+    "half": "https://www.royalmint.com/invest/bullion/bullion-coins/gold-coins/the-half-sovereign-2024-gold-bullion-coin-in-blister/",
+    "quarter": "https://www.royalmint.com/invest/bullion/bullion-coins/gold-coins/the-quarter-sovereign-2024-gold-bullion-coin-in-blister/"
+}
+
 if __name__ == "__main__":
-    britannia_urls = {
-        "1oz": "https://www.royalmint.com/invest/bullion/bullion-coins/gold-coins/britannia-2025-1oz-gold-bullion-coin/",
-        "1/2oz": "https://www.royalmint.com/invest/bullion/bullion-coins/gold-coins/britannia-2024-half-oz-gold-bullion-coin-in-blister/",
-        "1/4oz": "https://www.royalmint.com/invest/bullion/bullion-coins/gold-coins/britannia-2025-14oz-gold-bullion-coin-in-blister/"
-    }
-    
-    sovereign_urls = {
-        "double": "https://www.royalmint.com/invest/bullion/bullion-coins/gold-coins/the-double-sovereign-2024-gold-bullion-coin-in-blister/",
-        "full": "https://www.royalmint.com/invest/bullion/bullion-coins/gold-coins/the-sovereign-2024-gold-bullion-coin-in-blister/",
-        "half": "https://www.royalmint.com/invest/bullion/bullion-coins/gold-coins/the-half-sovereign-2024-gold-bullion-coin-in-blister/",
-        "quarter": "https://www.royalmint.com/invest/bullion/bullion-coins/gold-coins/the-quarter-sovereign-2024-gold-bullion-coin-in-blister/"
-    }
-    
     # Test Britannias
-    for size, url in britannia_urls.items():
+    for size, url in BRITANNIA_URLS.items():
         try:
             price = get_cgt_free_coin_price(url)
             print(f"Current price of {size} Britannia: £{price:.2f}")
@@ -43,7 +43,7 @@ if __name__ == "__main__":
             print(f"Error fetching price for {size} Britannia: {e}")
     
     # Test Sovereigns
-    for size, url in sovereign_urls.items():
+    for size, url in SOVEREIGN_URLS.items():
         try:
             price = get_cgt_free_coin_price(url)
             print(f"Current price of {size} Sovereign: £{price:.2f}")
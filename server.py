@@ -0,0 +1,376 @@
+import asyncio
+import json
+import math
+import os
+import re
+from datetime import datetime, timedelta
+from urllib.parse import urlsplit, parse_qs
+from getprice import load_config, get_gold_price, get_exchange_rate, get_historical_gold_price
+from scrape import get_cgt_free_coin_price, BRITANNIA_URLS, SOVEREIGN_URLS
+
+HOST = "127.0.0.1"
+PORT = 8765
+PORTFOLIO_DIR = "portfolios"
+CACHE_FILE = "price_cache.json"
+
+# The free metalpriceapi.com tier only updates once per day
+QUOTE_TTL = timedelta(days=1)
+COIN_TTL = timedelta(hours=1)
+# Seconds to wait on an upstream fetch before giving up on it
+UPSTREAM_TIMEOUT = 15
+
+PORTFOLIO_NAME = re.compile(r"[A-Za-z0-9_-]{1,64}")
+CURRENCY_CODE = re.compile(r"[A-Z]{3}")
+
+# Shared across every portfolio: key -> (expires, task). Storing the task rather
+# than its result means concurrent requests for the same key share one upstream call.
+quote_cache = {}
+rate_cache = {}
+coin_cache = {}
+historical_pending = {}
+# Historical prices never change, so they are kept on disk between runs
+historical_prices = {}
+
+class HTTPError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+def load_price_cache():
+    try:
+        with open(CACHE_FILE, 'r') as file:
+            return json.load(file)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+def write_json(path, data):
+    """Write via a temporary file so a crash mid-write can't leave a truncated file"""
+    temp_path = f"{path}.tmp"
+    with open(temp_path, 'w') as file:
+        json.dump(data, file, indent=4)
+    os.replace(temp_path, path)
+
+def save_price_cache():
+    write_json(CACHE_FILE, historical_prices)
+
+async def cached(cache, key, ttl, func, *args):
+    """Run a blocking fetch in a thread, sharing the result until it expires"""
+    entry = cache.get(key)
+    if entry and datetime.now() < entry[0]:
+        task = entry[1]
+    else:
+        task = asyncio.ensure_future(asyncio.to_thread(func, *args))
+        cache[key] = (datetime.now() + ttl, task)
+    try:
+        # Shield so one disconnecting client doesn't cancel the fetch for the others
+        return await asyncio.wait_for(asyncio.shield(task), UPSTREAM_TIMEOUT)
+    except Exception as e:
+        # Don't cache failures, or a hung fetch would block every later request for the key
+        if key in cache and cache[key][1] is task:
+            del cache[key]
+        if isinstance(e, asyncio.TimeoutError):
+            raise HTTPError(502, "Upstream request timed out")
+        # Anything raised by the fetch itself is an upstream API or scraping failure
+        raise HTTPError(502, str(e)) from e
+
+def check_currency(currency):
+    # Currency codes go into upstream URLs and cache keys
+    if not isinstance(currency, str) or not CURRENCY_CODE.fullmatch(currency):
+        raise HTTPError(400, f"Invalid currency code: {currency}")
+
+async def gold_price(api_key, currency):
+    check_currency(currency)
+    return await cached(quote_cache, currency, QUOTE_TTL, get_gold_price, api_key, currency)
+
+async def exchange_rate(api_key, from_currency, to_currency):
+    check_currency(from_currency)
+    check_currency(to_currency)
+    return await cached(rate_cache, (from_currency, to_currency), QUOTE_TTL, get_exchange_rate, api_key, from_currency, to_currency)
+
+async def historical_gold_price(api_key, date, currency):
+    check_currency(currency)
+    try:
+        day = datetime.strptime(date, '%Y-%m-%d').date()
+    except ValueError:
+        raise HTTPError(400, f"Invalid date: {date}, expected YYYY-MM-DD")
+    if day > datetime.now().date():
+        raise HTTPError(400, f"No gold price yet for {date}")
+
+    date = day.isoformat()
+    key = f"{date}:{currency}"
+    if key in historical_prices:
+        return historical_prices[key]
+    price = await cached(historical_pending, key, QUOTE_TTL, get_historical_gold_price, api_key, date, currency)
+    # Today's price can still change, so only past days are kept for good.
+    # Callers save the price cache once they have finished a batch of lookups.
+    if day < datetime.now().date():
+        historical_prices.setdefault(key, price)
+        historical_pending.pop(key, None)
+    return price
+
+async def coin_price(url):
+    return await cached(coin_cache, url, COIN_TTL, get_cgt_free_coin_price, url)
+
+def portfolio_path(name):
+    if not PORTFOLIO_NAME.fullmatch(name):
+        raise HTTPError(400, f"Invalid portfolio name: {name}")
+    return os.path.join(PORTFOLIO_DIR, f"{name}.json")
+
+def list_portfolios():
+    try:
+        files = os.listdir(PORTFOLIO_DIR)
+    except FileNotFoundError:
+        return []
+    return sorted(f[:-5] for f in files if f.endswith('.json') and PORTFOLIO_NAME.fullmatch(f[:-5]))
+
+def load_portfolio(name):
+    try:
+        with open(portfolio_path(name), 'r') as file:
+            portfolio = json.load(file)
+    except FileNotFoundError:
+        raise HTTPError(404, f"No such portfolio: {name}")
+    except json.JSONDecodeError:
+        raise HTTPError(500, f"Portfolio file for {name} is corrupt")
+    if not isinstance(portfolio, dict) or 'currency' not in portfolio or 'inventory' not in portfolio:
+        raise HTTPError(500, f"Portfolio file for {name} is missing its currency or inventory")
+    return portfolio
+
+def save_portfolio(name, portfolio):
+    path = portfolio_path(name)
+    os.makedirs(PORTFOLIO_DIR, exist_ok=True)
+    write_json(path, portfolio)
+
+def is_number(value):
+    # bool is a subclass of int, and NaN/inf would poison every total
+    return isinstance(value, (int, float)) and not isinstance(value, bool) and math.isfinite(value)
+
+def update_portfolio(name, update):
+    """Create or update a portfolio from a PUT body with 'currency' and/or 'inventory'"""
+    try:
+        portfolio = load_portfolio(name)
+    except HTTPError as e:
+        if e.status != 404:
+            raise
+        portfolio = {"currency": "USD", "inventory": []}
+
+    if 'currency' in update:
+        currency = update['currency']
+        if isinstance(currency, str):
+            currency = currency.upper()
+        check_currency(currency)
+        portfolio['currency'] = currency
+    if 'inventory' in update:
+        inventory = update['inventory']
+        if not isinstance(inventory, list):
+            raise HTTPError(400, "Inventory must be a list of purchases")
+        for item in inventory:
+            try:
+                # Timezone-aware dates can't be sorted alongside the TUI's naive ones
+                valid = datetime.fromisoformat(item['date']).tzinfo is None
+                valid = valid and is_number(item['price']) and is_number(item['weight'])
+                if 'id' in item:
+                    valid = valid and isinstance(item['id'], int) and not isinstance(item['id'], bool)
+            except (TypeError, KeyError, ValueError):
+                valid = False
+            if not valid:
+                raise HTTPError(400, f"Invalid inventory entry: {item}")
+            item.setdefault('is_cgt_free', False)
+        portfolio['inventory'] = inventory
+
+    save_portfolio(name, portfolio)
+    return portfolio
+
+async def calculate_valuation(api_key, name):
+    portfolio = load_portfolio(name)
+    inventory = portfolio['inventory']
+    currency = portfolio['currency']
+    price, timestamp = await gold_price(api_key, currency)
+
+    total_weight = sum(item['weight'] for item in inventory)
+    total_value = sum((item['weight'] / 31.1035) * price for item in inventory)
+    total_purchase_price = sum(item['price'] for item in inventory)
+    cgt_free_value = sum((item['weight'] / 31.1035) * price for item in inventory if item.get('is_cgt_free'))
+    return {
+        'portfolio': name,
+        'currency': currency,
+        'gold_price': price,
+        'timestamp': timestamp,
+        'total_weight': total_weight,
+        'total_value': total_value,
+        'total_purchase_price': total_purchase_price,
+        'profit_loss': total_value - total_purchase_price,
+        'cgt_free_value': cgt_free_value,
+        'non_cgt_free_value': total_value - cgt_free_value
+    }
+
+async def calculate_timeline(api_key, name):
+    """Same timeline as the TUI graph, fetching each distinct date once and concurrently"""
+    portfolio = load_portfolio(name)
+    currency = portfolio['currency']
+    sorted_inventory = sorted(portfolio['inventory'], key=lambda x: datetime.fromisoformat(x['date']))
+    dates = sorted({datetime.fromisoformat(item['date']).strftime('%Y-%m-%d') for item in sorted_inventory})
+    cached_count = len(historical_prices)
+    results = await asyncio.gather(
+        *(historical_gold_price(api_key, date, currency) for date in dates),
+        return_exceptions=True
+    )
+    if len(historical_prices) != cached_count:
+        save_price_cache()
+    prices = {date: price for date, price in zip(dates, results) if not isinstance(price, Exception)}
+
+    timeline = []
+    running_cost = 0
+    running_weight = 0
+    for item in sorted_inventory:
+        date = datetime.fromisoformat(item['date'])
+        running_cost += item['price']
+        running_weight += item['weight']
+        historical_price = prices.get(date.strftime('%Y-%m-%d'))
+        if historical_price is None:
+            continue
+        value = (running_weight / 31.1035) * historical_price
+        timeline.append({
+            'date': date.isoformat(),
+            'total_value': value,
+            'total_cost': running_cost,
+            'profit_loss': value - running_cost
+        })
+    return {'portfolio': name, 'currency': currency, 'timeline': timeline}
+
+async def coin_prices():
+    coins = {"britannia": BRITANNIA_URLS, "sovereign": SOVEREIGN_URLS}
+    lookups = [(coin, size, url) for coin, urls in coins.items() for size, url in urls.items()]
+    results = await asyncio.gather(*(coin_price(url) for _, _, url in lookups), return_exceptions=True)
+    prices = {coin: {} for coin in coins}
+    for (coin, size, _), price in zip(lookups, results):
+        prices[coin][size] = None if isinstance(price, Exception) else price
+    return prices
+
+def query_param(query, name):
+    values = query.get(name)
+    if not values:
+        raise HTTPError(400, f"Missing query parameter: {name}")
+    return values[0]
+
+async def dispatch(api_key, method, target, body):
+    url = urlsplit(target)
+    query = parse_qs(url.query)
+    parts = [part for part in url.path.split('/') if part]
+
+    if method == 'GET' and parts == ['price']:
+        currency = query_param(query, 'currency').upper()
+        price, timestamp = await gold_price(api_key, currency)
+        return {'currency': currency, 'gold_price': price, 'timestamp': timestamp}
+    if method == 'GET' and parts == ['rate']:
+        from_currency = query_param(query, 'from').upper()
+        to_currency = query_param(query, 'to').upper()
+        rate = await exchange_rate(api_key, from_currency, to_currency)
+        return {'from': from_currency, 'to': to_currency, 'rate': rate}
+    if method == 'GET' and parts == ['historical']:
+        date = query_param(query, 'date')
+        currency = query_param(query, 'currency').upper()
+        cached_count = len(historical_prices)
+        price = await historical_gold_price(api_key, date, currency)
+        if len(historical_prices) != cached_count:
+            save_price_cache()
+        return {'date': date, 'currency': currency, 'gold_price': price}
+    if method == 'GET' and parts == ['coins']:
+        return await coin_prices()
+    if method == 'GET' and parts == ['portfolios']:
+        return {'portfolios': list_portfolios()}
+    if method == 'GET' and parts == ['valuations']:
+        names = list_portfolios()
+        results = await asyncio.gather(
+            *(calculate_valuation(api_key, name) for name in names),
+            return_exceptions=True
+        )
+        # A broken portfolio is reported on its own rather than failing the rest
+        valuations = [
+            {'portfolio': name, 'error': str(result)} if isinstance(result, Exception) else result
+            for name, result in zip(names, results)
+        ]
+        return {'valuations': valuations}
+    if len(parts) == 2 and parts[0] == 'portfolios':
+        if method == 'GET':
+            return load_portfolio(parts[1])
+        if method == 'PUT':
+            try:
+                update = json.loads(body or b'{}')
+            except json.JSONDecodeError:
+                raise HTTPError(400, "Request body must be JSON")
+            if not isinstance(update, dict):
+                raise HTTPError(400, "Request body must be a JSON object")
+            return update_portfolio(parts[1], update)
+        if method == 'DELETE':
+            path = portfolio_path(parts[1])
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                raise HTTPError(404, f"No such portfolio: {parts[1]}")
+            return {'deleted': parts[1]}
+    if method == 'GET' and len(parts) == 3 and parts[0] == 'portfolios':
+        if parts[2] == 'valuation':
+            return await calculate_valuation(api_key, parts[1])
+        if parts[2] == 'timeline':
+            return await calculate_timeline(api_key, parts[1])
+    raise HTTPError(404, f"Not found: {method} {url.path}")
+
+async def handle_connection(api_key, reader, writer):
+    """Serve a single HTTP/1.1 request, then close the connection"""
+    status = 200
+    try:
+        request_line = (await reader.readline()).decode('latin-1')
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            header, _, value = line.decode('latin-1').partition(':')
+            headers[header.strip().lower()] = value.strip()
+        method, target, _ = request_line.split(' ', 2)
+        body = await reader.readexactly(int(headers.get('content-length', 0)))
+    except (asyncio.IncompleteReadError, ConnectionError):
+        writer.close()
+        return
+    except ValueError:
+        status, payload = 400, {'error': "Malformed HTTP request"}
+    else:
+        try:
+            payload = await dispatch(api_key, method, target, body)
+        except HTTPError as e:
+            status, payload = e.status, {'error': str(e)}
+        except Exception as e:
+            # Upstream failures arrive as HTTPError(502), so anything else is a local problem
+            status, payload = 500, {'error': f"Internal server error: {e}"}
+
+    data = json.dumps(payload).encode('utf-8')
+    reason = {200: "OK", 400: "Bad Request", 404: "Not Found", 500: "Internal Server Error", 502: "Bad Gateway"}.get(status, "Error")
+    writer.write(
+        f"HTTP/1.1 {status} {reason}\r\n"
+        f"Content-Type: application/json\r\n"
+        f"Content-Length: {len(data)}\r\n"
+        f"Connection: close\r\n\r\n".encode('latin-1') + data
+    )
+    try:
+        await writer.drain()
+    except ConnectionError:
+        pass
+    writer.close()
+
+async def main():
+    config = load_config()
+    api_key = config.get("api_key", "")
+    historical_prices.update(load_price_cache())
+
+    server = await asyncio.start_server(
+        lambda reader, writer: handle_connection(api_key, reader, writer), HOST, PORT
+    )
+    print(f"Serving portfolios from {PORTFOLIO_DIR}/ on http://{HOST}:{PORT}")
+    async with server:
+        await server.serve_forever()
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        pass
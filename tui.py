@@ -5,10 +5,17 @@ import time
 from datetime import datetime, timedelta
 from getprice import get_gold_price, get_exchange_rate, get_historical_gold_price  # Add get_exchange_rate
 from scrape import get_cgt_free_coin_price
+import client
 
 INVENTORY_FILE = "inventory.json"
 CONFIG_FILE = "config.json"
 
+# Set from the "server" and "portfolio" config keys to use server.py instead of local files and API calls
+SERVER = None
+PORTFOLIO = "default"
+# Set when saving to the server failed, so the changes are retried before they're needed
+UNSAVED = False
+
 def get_user_input(stdscr, prompt):
     stdscr.clear()
     stdscr.addstr(0, 0, prompt)
@@ -30,26 +37,63 @@ def get_menu_choice(stdscr, menu_text, input_prompt):
     curses.noecho()
     return choice
 
-def load_inventory():
+def normalize_inventory(inventory):
+    if not inventory:
+        inventory = []
+    next_id = max((item['id'] for item in inventory if 'id' in item), default=0) + 1
+    # Ensure all items have the 'is_cgt_free' key
+    for item in inventory:
+        if 'is_cgt_free' not in item:
+            item['is_cgt_free'] = False
+        # Entries added through the server API may have no ID or name
+        if 'id' not in item:
+            item['id'] = next_id
+            next_id += 1
+        if 'name' not in item:
+            item['name'] = f"Purchase {item['id']}"
+        # Convert date to ISO format if necessary
+        try:
+            datetime.fromisoformat(item['date'])
+        except ValueError:
+            item['date'] = datetime.strptime(item['date'], "%d-%m-%Y").isoformat()
+    return inventory
+
+def load_inventory_file():
     try:
         with open(INVENTORY_FILE, 'r') as file:
-            inventory = json.load(file)
-            if not inventory:
-                inventory = []
-            # Ensure all items have the 'is_cgt_free' key
-            for item in inventory:
-                if 'is_cgt_free' not in item:
-                    item['is_cgt_free'] = False
-                # Convert date to ISO format if necessary
-                try:
-                    datetime.fromisoformat(item['date'])
-                except ValueError:
-                    item['date'] = datetime.strptime(item['date'], "%d-%m-%Y").isoformat()
+            inventory = normalize_inventory(json.load(file))
     except (FileNotFoundError, json.JSONDecodeError):
         inventory = []
     return inventory
 
-def save_inventory(inventory):
+def load_inventory():
+    if SERVER:
+        portfolio = client.load_portfolio(SERVER, PORTFOLIO)
+        return normalize_inventory(portfolio['inventory'] if portfolio else [])
+    return load_inventory_file()
+
+def join_portfolio(config):
+    """Take the currency of an existing server-side portfolio, or create it from the local inventory file"""
+    portfolio = client.load_portfolio(SERVER, PORTFOLIO)
+    if portfolio is None:
+        client.save_portfolio(SERVER, PORTFOLIO, inventory=load_inventory_file(), currency=config['currency'])
+    elif portfolio['currency'] != config.get('currency'):
+        # Its prices are stored in that currency, so relabelling them would be wrong
+        config['currency'] = portfolio['currency']
+        save_config(config)
+    return config
+
+def save_inventory(inventory, currency=None):
+    """Currency is only sent to the server; locally it's kept in config.json"""
+    global UNSAVED
+    if SERVER:
+        try:
+            client.save_portfolio(SERVER, PORTFOLIO, inventory=inventory, currency=currency)
+        except client.ServerError:
+            UNSAVED = True
+            raise
+        UNSAVED = False
+        return
     with open(INVENTORY_FILE, 'w') as file:
         json.dump(inventory, file, indent=4)
 
@@ -66,6 +110,21 @@ def save_config(config):
     with open(CONFIG_FILE, 'w') as file:
         json.dump(config, file, indent=4)
 
+def fetch_gold_price(api_key, currency):
+    if SERVER:
+        return client.get_gold_price(SERVER, currency)
+    return get_gold_price(api_key, currency)
+
+def fetch_exchange_rate(api_key, from_currency, to_currency):
+    if SERVER:
+        return client.get_exchange_rate(SERVER, from_currency, to_currency)
+    return get_exchange_rate(api_key, from_currency, to_currency)
+
+def fetch_historical_gold_price(api_key, date, currency):
+    if SERVER:
+        return client.get_historical_gold_price(SERVER, date, currency)
+    return get_historical_gold_price(api_key, date, currency)
+
 def display_inventory(stdscr, inventory, currency):
     """Display inventory with proper screen handling"""
     stdscr.nodelay(0)  # Disable nodelay mode while in inventory
@@ -89,8 +148,12 @@ def remove_entry(stdscr, inventory):
     entry_id = int(stdscr.getstr(1, 0).decode('utf-8'))
     curses.noecho()
     inventory = [item for item in inventory if item['id'] != entry_id]
-    save_inventory(inventory)
-    stdscr.addstr(2, 0, "Entry removed. Press any key to continue.")
+    try:
+        save_inventory(inventory)
+        stdscr.addstr(2, 0, "Entry removed. Press any key to continue.")
+    except client.ServerError as e:
+        stdscr.addstr(2, 0, f"Entry removed, but could not save it to the server: {e}")
+        stdscr.addstr(3, 0, "It will be sent again with the next change or on exit. Press any key to continue.")
     stdscr.refresh()
     stdscr.getch()
     return inventory
@@ -118,40 +181,42 @@ def change_currency(stdscr, config, api_key, inventory):
 
     try:
         # Get exchange rate from old currency to new currency
-        exchange_rate = get_exchange_rate(api_key, old_currency, new_currency)
+        exchange_rate = fetch_exchange_rate(api_key, old_currency, new_currency)
         
-        # Update all monetary values in inventory
-        for item in inventory:
+        # Update all monetary values in a copy of the inventory, so a failed save leaves it unchanged
+        converted = [dict(item) for item in inventory]
+        for item in converted:
             item['price'] = item['price'] * exchange_rate
             if 'historical_value' in item:
                 item['historical_value'] = item['historical_value'] * exchange_rate
         
         # Fetch new gold price in the new currency
         try:
-            gold_price, timestamp = get_gold_price(api_key, new_currency)
-            for item in inventory:
+            gold_price, timestamp = fetch_gold_price(api_key, new_currency)
+            for item in converted:
                 item['gold_price'] = gold_price
                 item['gold_price_timestamp'] = datetime.fromtimestamp(timestamp).isoformat()
-            save_inventory(inventory)
-            
-            stdscr.addstr(2, 0, "Converting historical values...")
-            stdscr.refresh()
-            
-            # Update the config with the new currency
-            config['currency'] = new_currency
-            save_config(config)
-            
-            stdscr.addstr(3, 0, f"Currency changed to {new_currency}. All values updated. Press Enter to return to main menu.")
-            stdscr.refresh()
-            stdscr.getch()
-            return config, inventory, gold_price, timestamp
-
         except Exception as e:
             stdscr.addstr(2, 0, f"Error fetching new gold price: {e}")
             stdscr.refresh()
             stdscr.getch()
             return config, inventory, None, None
 
+        # Prices and currency go to the server in one write, so it never has one without the other
+        save_inventory(converted, currency=new_currency)
+        
+        stdscr.addstr(2, 0, "Converting historical values...")
+        stdscr.refresh()
+        
+        # Update the config with the new currency
+        config['currency'] = new_currency
+        save_config(config)
+        
+        stdscr.addstr(3, 0, f"Currency changed to {new_currency}. All values updated. Press Enter to return to main menu.")
+        stdscr.refresh()
+        stdscr.getch()
+        return config, converted, gold_price, timestamp
+
     except Exception as e:
         stdscr.addstr(2, 0, f"Error changing currency: {e}")
         stdscr.refresh()
@@ -189,7 +254,7 @@ def calculate_timeline_data(stdscr, inventory, api_key, currency):
                     stdscr.addstr(3, 0, f"Fetching historical price for entry {i+1} of {len(sorted_inventory)}...")
                     stdscr.refresh()
                     
-                    historical_price = get_historical_gold_price(api_key, date.strftime('%Y-%m-%d'), currency)
+                    historical_price = fetch_historical_gold_price(api_key, date.strftime('%Y-%m-%d'), currency)
                     item['historical_value'] = historical_price
                     items_to_update.append(item)
                 except Exception as e:
@@ -308,13 +373,30 @@ def display_graph(stdscr, inventory, api_key, currency):
         stdscr.getch()
         return
         
-    timeline = calculate_timeline_data(stdscr, inventory, api_key, currency)
+    save_warning = None
+    if SERVER:
+        # The graph comes from the server's copy, so send any changes it's missing first
+        if UNSAVED:
+            try:
+                save_inventory(inventory)
+            except client.ServerError as e:
+                save_warning = f"Unsaved changes are not included: {e}"
+        # The server fetches all purchase dates concurrently from its shared cache
+        try:
+            timeline = [dict(point, date=datetime.fromisoformat(point['date'])) for point in client.get_timeline(SERVER, PORTFOLIO)]
+        except Exception as e:
+            stdscr.addstr(4, 0, f"Error: {str(e)}")
+            timeline = None
+    else:
+        timeline = calculate_timeline_data(stdscr, inventory, api_key, currency)
     
     if timeline:
         stdscr.clear()
         stdscr.addstr(0, 0, "Portfolio Value Over Time", curses.A_BOLD)
         draw_graph(stdscr, timeline, 2)
         stdscr.addstr(20, 0, "Press any key to return to main menu")
+        if save_warning:
+            stdscr.addstr(21, 0, save_warning, curses.color_pair(1))
     else:
         stdscr.addstr(2, 0, "Could not generate graph. Press any key to return.")
     
@@ -322,30 +404,47 @@ def display_graph(stdscr, inventory, api_key, currency):
     stdscr.getch()
 
 def main(stdscr):
+    global SERVER, PORTFOLIO
     config = load_config()
+    SERVER = config.get("server") or None
+    PORTFOLIO = config.get("portfolio", PORTFOLIO)
     # Prompt for currency if not set
     if not config.get('currency'):
         config['currency'] = get_user_input(stdscr, "Enter your preferred currency code (e.g., USD, EUR): ").upper()
         save_config(config)
+    if SERVER:
+        try:
+            config = join_portfolio(config)
+        except client.ServerError as e:
+            stdscr.addstr(0, 0, f"Error connecting to server: {e}")
+            stdscr.refresh()
+            stdscr.getch()
+            return
     currency = config.get("currency", "USD")
-    # Prompt for API key if not set or invalid
-    if not config.get('api_key') or len(config['api_key']) != 32:
+    # Prompt for API key if not set or invalid (the server holds its own)
+    if not SERVER and (not config.get('api_key') or len(config['api_key']) != 32):
         config['api_key'] = get_user_input(stdscr, "Enter your 32-character metalpriceapi.com API key: ")
         save_config(config)
     api_key = config.get("api_key", "")
 
-    inventory = load_inventory()
-    purchase_id = len(inventory) + 1
+    try:
+        inventory = load_inventory()
+    except client.ServerError as e:
+        stdscr.addstr(0, 0, f"Error loading portfolio from server: {e}")
+        stdscr.refresh()
+        stdscr.getch()
+        return
+    purchase_id = max((item['id'] for item in inventory), default=0) + 1
     
-    # Check if the stored gold price is still valid
-    if inventory and 'gold_price_timestamp' in inventory[0]:
+    # Check if the stored gold price is still valid (and that every entry has one)
+    if inventory and all('gold_price_timestamp' in item for item in inventory):
         last_update = datetime.fromisoformat(inventory[0]['gold_price_timestamp'])
         if datetime.now() < last_update + timedelta(days=1):
             gold_price = inventory[0]['gold_price']
             timestamp = last_update.timestamp()
         else:
             try:
-                gold_price, timestamp = get_gold_price(api_key, currency)
+                gold_price, timestamp = fetch_gold_price(api_key, currency)
                 for item in inventory:
                     item['gold_price'] = gold_price
                     item['gold_price_timestamp'] = datetime.fromtimestamp(timestamp).isoformat()
@@ -357,7 +456,7 @@ def main(stdscr):
                 return
     else:
         try:
-            gold_price, timestamp = get_gold_price(api_key, currency)
+            gold_price, timestamp = fetch_gold_price(api_key, currency)
             for item in inventory:
                 item['gold_price'] = gold_price
                 item['gold_price_timestamp'] = datetime.fromtimestamp(timestamp).isoformat()
@@ -515,7 +614,14 @@ def main(stdscr):
             })
             
             purchase_id += 1
-            save_inventory(inventory)
+            try:
+                save_inventory(inventory)
+            except client.ServerError as e:
+                stdscr.clear()
+                stdscr.addstr(0, 0, f"Could not save purchase to the server: {e}")
+                stdscr.addstr(1, 0, "It will be sent again with the next change or on exit. Press any key to continue.")
+                stdscr.refresh()
+                stdscr.getch()
         elif key == ord('c'):
             stdscr.clear()
             stdscr.addstr(0, 0, "Settings:")
@@ -539,6 +645,16 @@ def main(stdscr):
         elif key == ord('g'):
             display_graph(stdscr, inventory, api_key, currency)
         elif key == ord('e'):
+            if UNSAVED:
+                try:
+                    save_inventory(inventory)
+                except client.ServerError as e:
+                    choice = get_menu_choice(stdscr,
+                        [f"Could not save your changes to the server: {e}",
+                         "Exiting now will lose them."],
+                        "Exit anyway? (y/n): ")
+                    if choice.lower() != 'y':
+                        continue
             break
 
 if __name__ == "__main__":